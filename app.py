@@ -1,14 +1,25 @@
+# Patch blocking I/O first so a worker yields to other requests while waiting on Gemini.
+# Deploy with: gunicorn -k gevent -w 4 --worker-connections 1000 app:app
+from gevent import monkey
+monkey.patch_all()
+
 import os
+import json
+import atexit
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceInstructEmbeddings
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from semantic_cache import SemanticCache
+from batched_embeddings import load_embeddings
+from chunk_sources import ChunkSources
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,14 +31,18 @@ CORS(app) # Allow cross-origin requests
 VECTOR_STORE_PATH = "chroma_db"
 MODEL_NAME = "all-MiniLM-L6-v2"  # Smaller, faster model
 GEMINI_MODEL_NAME = "gemini-1.0-pro"
+SEMANTIC_CACHE_PATH = "cache/semantic_cache"
+
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
 
 # --- LOAD MODELS AND VECTOR STORE (GLOBAL) ---
 # This section runs only once when the server starts.
 print("Loading models and Chroma vector store for the backend...")
 
 try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    # Concurrent requests share one encode() call per batch instead of one forward pass each
+    embeddings = load_embeddings(MODEL_NAME)
     
     # Load Chroma vector store
     if not os.path.exists(VECTOR_STORE_PATH):
@@ -37,11 +52,13 @@ try:
         persist_directory=VECTOR_STORE_PATH,
         embedding_function=embeddings
     )
+    chunk_sources = ChunkSources.load(VECTOR_STORE_PATH)
     
     llm = ChatGoogleGenerativeAI(
         model=GEMINI_MODEL_NAME, 
         temperature=0.3,
-        google_api_key=os.getenv("GOOGLE_API_KEY")
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        transport="rest"  # gRPC bypasses gevent's patched sockets and would block the worker
     )
     
     prompt_template = """
@@ -58,56 +75,118 @@ try:
     Answer:
     """
     PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    chain = LLMChain(llm=llm, prompt=PROMPT)
+
+    # Retrieval and generation as one runnable: {"question", "query_vector"} -> adds "docs", then "answer".
+    # Retrieval reuses the query vector already computed for the semantic cache lookup.
+    retrieve = RunnableLambda(lambda x: vectorstore.similarity_search_by_vector(x["query_vector"], k=3))
+    generate = (
+        RunnableLambda(lambda x: {"context": format_docs(x["docs"]), "question": x["question"]})
+        | PROMPT
+        | llm
+        | StrOutputParser()
+    )
+    chain = RunnablePassthrough.assign(docs=retrieve).assign(answer=generate)
+
+    # Warm-start the semantic cache from the previous run and save it again on shutdown
+    semantic_cache = SemanticCache.load(SEMANTIC_CACHE_PATH)
+    atexit.register(semantic_cache.save, SEMANTIC_CACHE_PATH)
     print("Backend is ready.")
 except Exception as e:
     print(f"Error initializing backend models: {e}")
-    vectorstore, chain = None, None
+    vectorstore, chain, semantic_cache = None, None, None
 
-@app.route('/ask', methods=['POST'])
-def ask_question():
+def parse_query():
+    """
+    Validates the request body; returns (query, None) or (None, error response).
+    """
     if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
+        return None, (jsonify({"error": "Request must be JSON"}), 400)
 
     data = request.get_json()
     query = data.get('query')
 
     if not query:
-        return jsonify({"error": "Missing 'query' in request body"}), 400
+        return None, (jsonify({"error": "Missing 'query' in request body"}), 400)
         
     if not vectorstore or not chain:
-        return jsonify({"error": "Backend models not initialized."}), 500
+        return None, (jsonify({"error": "Backend models not initialized."}), 500)
 
     print(f"Received query: {query}")
+    return query, None
+
+@app.route('/ask', methods=['POST'])
+def ask_question():
+    query, error = parse_query()
+    if error:
+        return error
+
     try:
-        # 1. Retrieve relevant documents using Chroma similarity search
-        docs = vectorstore.similarity_search(query, k=3)
-        
-        # 2. Prepare context for the LLM
-        context = "\n\n".join([doc.page_content for doc in docs])
-        
-        # 3. Generate an answer
-        result = chain.run(context=context, question=query)
-
-        # 4. Extract sources
-        sources = []
-        for doc in docs:
-            source_file = os.path.basename(doc.metadata.get('source', 'Unknown'))
-            source_info = {
-                "source": source_file,
-                "page": doc.metadata.get('page', 'N/A')
-            }
-            if source_info not in sources:
-                sources.append(source_info)
+        # 1. Return a cached answer if a near-identical question was already answered
+        query_vector = embeddings.embed_query(query)
+        cached = semantic_cache.lookup(query_vector)
+        if cached is not None:
+            answer, sources = cached
+            print("Semantic cache hit.")
+            return jsonify({"answer": answer, "sources": sources})
+
+        # 2. Retrieve relevant documents and generate an answer
+        output = chain.invoke({"question": query, "query_vector": query_vector})
+        result = output["answer"]
+        sources = chunk_sources.for_docs(output["docs"])
         
         print(f"Generated Answer: {result}")
         print(f"Sources: {sources}")
 
+        semantic_cache.add(query_vector, result, sources)
         return jsonify({"answer": result, "sources": sources})
     except Exception as e:
         print(f"An error occurred: {e}")
         return jsonify({"error": "An internal error occurred."}), 500
 
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """
+    Server-Sent Events variant of /ask: one 'sources' event as soon as retrieval finishes,
+    then the answer as it is generated ('data' events), then a 'done' event.
+    """
+    query, error = parse_query()
+    if error:
+        return error
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n"
+
+    def generate():
+        try:
+            query_vector = embeddings.embed_query(query)
+            cached = semantic_cache.lookup(query_vector)
+            if cached is not None:
+                answer, sources = cached
+                yield sse(sources, event="sources")
+                yield sse(answer)
+                yield sse(None, event="done")
+                return
+
+            sources = None
+            answer_parts = []
+            for chunk in chain.stream({"question": query, "query_vector": query_vector}):
+                if "docs" in chunk:
+                    sources = chunk_sources.for_docs(chunk["docs"])
+                    yield sse(sources, event="sources")
+                if "answer" in chunk:
+                    answer_parts.append(chunk["answer"])
+                    yield sse(chunk["answer"])
+
+            # Cache before 'done': a client may close the stream as soon as it sees it
+            semantic_cache.add(query_vector, "".join(answer_parts), sources or [])
+            yield sse(None, event="done")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            yield sse({"error": "An internal error occurred."}, event="error")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
 if __name__ == '__main__':
     # Run the Flask app on port 5000
     app.run(debug=True, port=5000)
@@ -5,34 +5,77 @@ Backend logic for EduRAG: model loading, search, and preprocessing functions.
 import os
 from dotenv import load_dotenv
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from langchain_core.messages import get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
+from keyword_index import KeywordIndex
+from models import Models
+from batched_embeddings import load_embeddings
+from query_embeddings import embed_query
 from PIL import Image
 import io
 import base64
+import heapq
+import xxhash
+import ahocorasick
 
 # --- CONFIGURATION ---
 VECTOR_STORE_PATH = "chroma_db"
 MODEL_NAME = "all-MiniLM-L6-v2"
 GEMINI_MODEL_NAME = "gemini-2.5-flash"
+PASSTHROUGH_IMAGE_FORMATS = {"PNG", "JPEG"}  # Sent to the LLM without re-encoding
+CHARS_PER_TOKEN = 4  # Local token estimate used when conversation memory sizes its buffer
 
 load_dotenv()
 
+PHYSICS_SYNONYMS = {
+    "chapters": ["topics", "sections", "units"],
+    "chapter": ["topic", "section", "unit"],
+    "physics": ["physical science", "mechanics", "motion"],
+    "energy": ["power", "force", "work"],
+    "conservation": ["preservation", "constant"],
+    "law": ["principle", "rule", "theorem"],
+    "laws": ["principles", "rules", "theorems"],
+    "motion": ["movement", "kinematics"],
+    "electricity": ["electric", "electrical", "current"],
+    "magnetism": ["magnetic", "magnet"],
+    "light": ["optics", "optical", "rays"],
+    "waves": ["wave", "vibration", "oscillation"],
+    "wave": ["waves", "vibration", "oscillation"]
+}
+
+# Multi-pattern matcher over the synonym keys, built once at import
+SYNONYM_AUTOMATON = ahocorasick.Automaton()
+for _key, _synonyms in PHYSICS_SYNONYMS.items():
+    SYNONYM_AUTOMATON.add_word(_key, (_key, _synonyms))
+SYNONYM_AUTOMATON.make_automaton()
+
+class GeminiChat(ChatGoogleGenerativeAI):
+    """
+    ChatGoogleGenerativeAI with local token estimates. ConversationSummaryBufferMemory counts its buffer
+    on every save_context(), and Gemini's own count is a remote count-tokens request each time.
+    """
+
+    def get_num_tokens(self, text):
+        return len(text) // CHARS_PER_TOKEN + 1
+
+    def get_num_tokens_from_messages(self, messages, tools=None):
+        return sum(self.get_num_tokens(get_buffer_string([message])) for message in messages)
+
 def load_models():
     """
-    Loads the embedding model, LLM, and the Chroma vector store.
+    Loads the embedding model, LLM, the Chroma vector store and its BM25 keyword index.
+    The LLM is returned too, for callers that need it outside the chain (e.g. conversation summaries).
     """
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    embeddings = load_embeddings(MODEL_NAME)
     if not os.path.exists(VECTOR_STORE_PATH):
         raise FileNotFoundError(f"Chroma database not found at '{VECTOR_STORE_PATH}'. Please run 'python ingest.py' first.")
     vectorstore = Chroma(
         persist_directory=VECTOR_STORE_PATH,
         embedding_function=embeddings
     )
-    llm = ChatGoogleGenerativeAI(
+    llm = GeminiChat(
         model=GEMINI_MODEL_NAME,
         temperature=0.3,
         google_api_key=os.getenv("GOOGLE_API_KEY")
@@ -60,56 +103,80 @@ Student's Question: {question}
 Your Response:
 """
     PROMPT = PromptTemplate(template=prompt_template, input_variables=["conversation_history", "context", "question"])
-    chain = LLMChain(llm=llm, prompt=PROMPT)
-    return vectorstore, chain
+    # LCEL pipeline so callers can stream tokens with chain.stream()
+    chain = PROMPT | llm | StrOutputParser()
+    keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+    return Models(vectorstore, chain, keyword_index, llm=llm)
+
+def content_fingerprint(text):
+    """
+    64-bit xxh3 hash of the full chunk text, used to deduplicate retrieved chunks.
+    """
+    return xxhash.xxh3_64_intdigest(text)
 
-def hybrid_search(vectorstore, query, k=5):
+def semantic_search(vectorstore, query, k=5):
+    """
+    Same (doc, distance) results as similarity_search_with_score, using the cached query embedding.
+    """
+    return vectorstore.similarity_search_by_vector_with_relevance_scores(list(embed_query(vectorstore, query)), k=k)
+
+def hybrid_search(vectorstore, query, keyword_index, k=5):
     """
     Perform hybrid search combining semantic and keyword-based retrieval.
     """
-    semantic_docs = vectorstore.similarity_search_with_score(query, k=k)
-    all_docs = vectorstore.get()
-    keyword_matches = []
-    query_words = set(query.lower().split())
-    if 'documents' in all_docs and 'metadatas' in all_docs:
-        for i, (doc_text, metadata) in enumerate(zip(all_docs['documents'], all_docs['metadatas'])):
-            doc_words = set(doc_text.lower().split())
-            overlap = len(query_words.intersection(doc_words))
-            if overlap > 0:
-                from langchain.schema import Document
-                doc = Document(page_content=doc_text, metadata=metadata)
-                score = 1.0 / (overlap + 1)
-                keyword_matches.append((doc, score))
+    semantic_docs = semantic_search(vectorstore, query, k=k)
+    keyword_matches = keyword_index.search(query, k=k)
     all_results = semantic_docs + keyword_matches
     seen_content = set()
     unique_results = []
     for doc, score in all_results:
-        content_hash = hash(doc.page_content[:100])
+        content_hash = content_fingerprint(doc.page_content)
         if content_hash not in seen_content:
             seen_content.add(content_hash)
             unique_results.append((doc, score))
-    return sorted(unique_results, key=lambda x: x[1])[:k]
+    return heapq.nsmallest(k, unique_results, key=lambda x: x[1])
+
+def _is_word_boundary(text, i):
+    return i < 0 or i >= len(text) or not text[i].isalnum()
 
 def preprocess_query(query):
+    """
+    Appends synonyms for every synonym key found as a whole word in the query.
+    """
     processed_query = query.lower().strip()
-    physics_synonyms = {
-        "chapters": ["topics", "sections", "units"],
-        "physics": ["physical science", "mechanics", "motion"],
-        "energy": ["power", "force", "work"],
-        "conservation": ["preservation", "constant"],
-        "law": ["principle", "rule", "theorem"],
-        "motion": ["movement", "kinematics"],
-        "electricity": ["electric", "electrical", "current"],
-        "magnetism": ["magnetic", "magnet"],
-        "light": ["optics", "optical", "rays"],
-        "waves": ["wave", "vibration", "oscillation"]
-    }
-    query_terms = processed_query.split()
-    expanded_terms = []
-    for term in query_terms:
-        expanded_terms.append(term)
-        for key, synonyms in physics_synonyms.items():
-            if term in key or key in term:
-                expanded_terms.extend(synonyms)
-    expanded_query = " ".join(expanded_terms)
+    hits = []
+    for end, (key, synonyms) in SYNONYM_AUTOMATON.iter(processed_query):
+        start = end - len(key) + 1
+        # Skip keys inside longer words ("lawyer", "lightning")
+        if _is_word_boundary(processed_query, start - 1) and _is_word_boundary(processed_query, end + 1):
+            hits.extend(synonyms)
+    expanded_query = " ".join([processed_query, *dict.fromkeys(hits)]) if hits else processed_query
     return query, expanded_query
+
+def process_image_input(uploaded_image):
+    """
+    Reads an uploaded image once. PNG/JPEG bytes are base64-encoded as uploaded; anything else
+    is re-encoded as JPEG. The decoded PIL image is kept only for the Streamlit preview.
+    """
+    if uploaded_image is not None:
+        try:
+            raw = uploaded_image.getvalue()
+            image = Image.open(io.BytesIO(raw))
+            if image.format in PASSTHROUGH_IMAGE_FORMATS:
+                img_bytes = raw
+                mime_type = Image.MIME[image.format]
+            else:
+                img_byte_arr = io.BytesIO()
+                image.convert("RGB").save(img_byte_arr, format="JPEG", quality=85)
+                img_bytes = img_byte_arr.getvalue()
+                mime_type = "image/jpeg"
+            img_base64 = base64.b64encode(img_bytes).decode()
+            return {
+                "image": image,
+                "base64": img_base64,
+                "mime_type": mime_type,
+                "description": "User uploaded an image related to their question"
+            }
+        except Exception as e:
+            return None
+    return None
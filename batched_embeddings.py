@@ -0,0 +1,134 @@
+# batched_embeddings.py
+"""
+LangChain embeddings adapters that coalesce concurrent query embeddings into one model call,
+backed by either the PyTorch sentence-transformers model or its quantized ONNX export.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --- CONFIGURATION ---
+MAX_BATCH_SIZE = 32
+TIMEOUT_MS = 15
+ONNX_MODEL_PATH = "onnx_model"  # Written by convert_to_onnx.py
+ONNX_MODEL_FILE = "model_quantized.onnx"
+MAX_SEQ_LENGTH = 256
+
+_STOP = object()  # Queued by close() to end the worker thread
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    embed_query() and embed_documents() calls from different requests are queued and a background
+    worker encodes up to max_batch_size texts at once, waiting at most timeout_ms for a batch to fill.
+    The worker is the only thread that calls the model, so encoders need not be thread-safe.
+    Call close() to stop the worker when the instance is discarded before the process exits.
+    """
+
+    def __init__(self, encode, max_batch_size=MAX_BATCH_SIZE, timeout_ms=TIMEOUT_MS):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_ms / 1000
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_sentence_transformer(cls, model_name, **kwargs):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        return cls(lambda texts: model.encode(texts, convert_to_numpy=True, normalize_embeddings=True), **kwargs)
+
+    def embed_documents(self, texts):
+        futures = [self._submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def embed_query(self, text):
+        return self._submit(text).result()
+
+    def _submit(self, text):
+        if self._closed:
+            raise RuntimeError("BatchedEmbeddings is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def close(self, timeout=None):
+        """
+        Encodes the queries already queued, then stops the worker thread.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.timeout
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                vectors = self._encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+
+
+class OnnxEmbeddings(BatchedEmbeddings):
+    """
+    Runs the int8-quantized ONNX export of the embedding model on ONNX Runtime,
+    mean-pooling token embeddings and L2-normalizing them like sentence-transformers does.
+    """
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, **kwargs):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        self._tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self._session = ort.InferenceSession(
+            os.path.join(model_path, ONNX_MODEL_FILE),
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self._session.get_inputs()}
+        super().__init__(self._encode_onnx, **kwargs)
+
+    def _encode_onnx(self, texts):
+        inputs = self._tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self._input_names}
+        token_embeddings = self._session.run(None, feed)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.linalg.norm(pooled, axis=1, keepdims=True)
+
+
+def load_embeddings(model_name, onnx_model_path=ONNX_MODEL_PATH):
+    """
+    Uses the quantized ONNX model when convert_to_onnx.py has been run, otherwise the PyTorch model.
+    """
+    if os.path.exists(os.path.join(onnx_model_path, ONNX_MODEL_FILE)):
+        return OnnxEmbeddings(onnx_model_path)
+    return BatchedEmbeddings.from_sentence_transformer(model_name)
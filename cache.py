@@ -0,0 +1,62 @@
+# cache.py
+"""
+On-disk log of answered standalone queries, used to warm-start the semantic cache after a restart or reconnect.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# --- CONFIGURATION ---
+CACHE_DB_PATH = "cache/answers.sqlite3"
+WARM_START_LIMIT = 1000
+
+
+class AnswerStore:
+    """
+    SQLite table of (query, answer, sources, query embedding) rows.
+    Embeddings are stored as float16 blobs to keep the file small. Only answers that don't depend on a
+    conversation belong here, since every row is loaded into the cache shared by all sessions.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    q TEXT NOT NULL,
+                    a TEXT NOT NULL,
+                    sources TEXT NOT NULL,
+                    emb BLOB NOT NULL
+                )
+                """
+            )
+
+    def add(self, query, answer, sources, query_vector):
+        emb = np.asarray(query_vector, dtype=np.float16).tobytes()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO answers (ts, q, a, sources, emb) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), query, answer, json.dumps(sources), emb)
+            )
+
+    def warm(self, semantic_cache, limit=WARM_START_LIMIT):
+        """
+        Loads the most recent rows into a SemanticCache, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a, sources, emb FROM answers ORDER BY ts DESC LIMIT ?", (limit,)
+            ).fetchall()
+        for answer, sources, emb in reversed(rows):
+            vector = np.frombuffer(emb, dtype=np.float16).astype(np.float32)
+            semantic_cache.add(vector, answer, json.loads(sources))
+        return len(rows)
@@ -0,0 +1,53 @@
+# chunk_sources.py
+"""
+Source file name and page of every chunk, written at ingest as parallel lists indexed by chunk id,
+so building the sources list for a response is a list lookup per retrieved chunk.
+"""
+import json
+import os
+
+CHUNK_SOURCES_FILE = "chunk_sources.json"
+
+
+def save_chunk_sources(vector_store_path, metadatas):
+    """
+    Writes the sidecar file; metadatas[i] must belong to the chunk with chunk_id i.
+    """
+    data = {
+        "basenames": [os.path.basename(metadata.get('source', 'Unknown')) for metadata in metadatas],
+        "pages": [metadata.get('page', 'N/A') for metadata in metadatas],
+    }
+    with open(os.path.join(vector_store_path, CHUNK_SOURCES_FILE), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class ChunkSources:
+    def __init__(self, basenames=(), pages=()):
+        self.basenames = list(basenames)
+        self.pages = list(pages)
+
+    @classmethod
+    def load(cls, vector_store_path):
+        """
+        Returns an empty table for stores ingested before chunk ids existed.
+        """
+        path = os.path.join(vector_store_path, CHUNK_SOURCES_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["basenames"], data["pages"])
+
+    def for_docs(self, docs):
+        """
+        Returns the distinct {"source", "page"} entries for the given documents, in retrieval order.
+        """
+        keys = []
+        for doc in docs:
+            chunk_id = doc.metadata.get('chunk_id')
+            if chunk_id is not None and chunk_id < len(self.basenames):
+                keys.append((self.basenames[chunk_id], self.pages[chunk_id]))
+            else:
+                # Store ingested before chunk ids existed
+                keys.append((os.path.basename(doc.metadata.get('source', 'Unknown')), doc.metadata.get('page', 'N/A')))
+        return [{"source": source, "page": page} for source, page in dict.fromkeys(keys)]
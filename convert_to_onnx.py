@@ -0,0 +1,37 @@
+import tempfile
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+# --- CONFIGURATION ---
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"  # Same model as MODEL_NAME in ingest.py
+ONNX_MODEL_PATH = "onnx_model"
+
+def convert_model():
+    """
+    Exports the embedding model to ONNX and applies int8 dynamic quantization,
+    saving the quantized model and its tokenizer to ONNX_MODEL_PATH for query-time embedding.
+    """
+    print(f"Exporting {MODEL_NAME} to ONNX...")
+    try:
+        model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    except Exception as e:
+        print(f"Error exporting model: {e}")
+        return
+
+    print("Quantizing to int8 (dynamic, AVX512-VNNI)...")
+    try:
+        with tempfile.TemporaryDirectory() as export_dir:
+            model.save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=ONNX_MODEL_PATH, quantization_config=qconfig)
+        tokenizer.save_pretrained(ONNX_MODEL_PATH)
+        print(f"Quantized model saved to '{ONNX_MODEL_PATH}'. The apps will now use it for query embeddings.")
+    except Exception as e:
+        print(f"Error quantizing model: {e}")
+
+
+if __name__ == "__main__":
+    convert_model()
@@ -1,14 +1,34 @@
 import os
+import uuid
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 import chromadb
+from chunk_sources import save_chunk_sources
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain_community.embeddings import HuggingFaceInstructEmbeddings
-from langchain_community.vectorstores import Chroma
 
 # --- CONFIGURATION ---
 DATA_PATH = "data/"
 VECTOR_STORE_PATH = "chroma_db"
 MODEL_NAME = "all-MiniLM-L6-v2"  # Smaller, faster model
+COLLECTION_NAME = "langchain"  # Default collection read by langchain's Chroma wrapper
+EMBED_BATCH_SIZE = 256
+# HNSW graph settings for the collection; distance stays L2 so the apps' score thresholds still apply
+HNSW_METADATA = {
+    "hnsw:space": "l2",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+def split_pdf_pages(pages):
+    """
+    Splits the pages of one PDF into chunks. Runs in a worker process, so it builds its own splitter.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(pages)
 
 def create_vector_db():
     """
@@ -20,7 +40,14 @@ def create_vector_db():
     # 1. Load documents from the specified directory
     try:
         print(f"Loading documents from '{DATA_PATH}'...")
-        loader = DirectoryLoader(DATA_PATH, glob='*.pdf', loader_cls=PyPDFLoader)
+        loader = DirectoryLoader(
+            DATA_PATH,
+            glob='*.pdf',
+            loader_cls=PyPDFLoader,
+            use_multithreading=True,
+            max_concurrency=os.cpu_count() or 4,
+            show_progress=True
+        )
         documents = loader.load()
         if not documents:
             print(f"No PDF files found in '{DATA_PATH}'. Please add your NCERT textbooks to this folder.")
@@ -30,52 +57,73 @@ def create_vector_db():
         print(f"Error loading documents: {e}")
         return
 
-    # 2. Split the documents into smaller chunks
+    # 2. Split the documents into smaller chunks, one PDF per worker process
     print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts = text_splitter.split_documents(documents)
+    pdfs = {}
+    for page in documents:
+        pdfs.setdefault(page.metadata.get('source'), []).append(page)
+    with ProcessPoolExecutor() as executor:
+        # Threaded loading returns PDFs in completion order; sort by path and rely on map() keeping
+        # submission order so chunk order is deterministic
+        ordered_pdfs = [pdfs[source] for source in sorted(pdfs, key=str)]
+        texts = list(itertools.chain.from_iterable(executor.map(split_pdf_pages, ordered_pdfs)))
     print(f"Split documents into {len(texts)} chunks.")
 
     # 3. Initialize the embedding model
     print(f"Initializing embedding model: {MODEL_NAME}...")
     try:
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-        embeddings = HuggingFaceEmbeddings(
-            model_name=MODEL_NAME,
-            model_kwargs={"device": "cpu"} # Use CPU for broader compatibility
-        )
-        print("Embedding model loaded successfully.")
+        import torch
+        from sentence_transformers import SentenceTransformer
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = SentenceTransformer(MODEL_NAME, device=device)
+        if device == "cuda":
+            model.half()  # FP16 halves memory traffic on GPU; CPU stays FP32
+        print(f"Embedding model loaded successfully on {device}.")
     except Exception as e:
         print(f"Error initializing embedding model: {e}")
         return
 
-    # 4. Create the Chroma vector store from the text chunks and embeddings
+    # 4. Embed the chunks in large batches and add them to the Chroma collection
     print("Creating Chroma vector store... (This may take a while depending on the number of documents)")
     try:
         # Remove existing database if it exists
         if os.path.exists(VECTOR_STORE_PATH):
             import shutil
             shutil.rmtree(VECTOR_STORE_PATH)
-        
-        # Create Chroma vector store
-        vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory=VECTOR_STORE_PATH
-        )
-        
-        print("Chroma vector store created successfully.")
-    except Exception as e:
-        print(f"Error creating Chroma vector store: {e}")
-        return
 
-    # 5. Persist the vector store
-    try:
-        vectorstore.persist()
+        client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+        collection = client.get_or_create_collection(COLLECTION_NAME, metadata=HNSW_METADATA)
+
+        # Sort chunks by length so each batch pads to a similar size
+        texts = sorted(texts, key=lambda doc: len(doc.page_content))
+        # Integer chunk ids index the source/page sidecar used when answering
+        for chunk_id, doc in enumerate(texts):
+            doc.metadata["chunk_id"] = chunk_id
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            documents_batch = [doc.page_content for doc in batch]
+            vectors = model.encode(
+                documents_batch,
+                batch_size=EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            collection.add(
+                ids=[str(uuid.uuid4()) for _ in batch],
+                embeddings=vectors.astype("float32").tolist(),
+                documents=documents_batch,
+                metadatas=[doc.metadata for doc in batch],
+            )
+            print(f"Embedded {min(start + EMBED_BATCH_SIZE, len(texts))}/{len(texts)} chunks.")
+
+        save_chunk_sources(VECTOR_STORE_PATH, [doc.metadata for doc in texts])
+
+        # PersistentClient writes to disk as it goes, so no separate persist step is needed
         print(f"Chroma vector store saved to '{VECTOR_STORE_PATH}'.")
         print("\nIngestion complete! You can now run 'streamlit run streamlit_app.py' to start the application.")
     except Exception as e:
-        print(f"Error saving Chroma vector store: {e}")
+        print(f"Error creating Chroma vector store: {e}")
+        return
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+# keyword_index.py
+"""
+BM25 keyword index over the Chroma corpus, built once at startup and used by hybrid search.
+"""
+import bm25s
+from langchain.schema import Document
+
+try:
+    import numba  # noqa: F401  (only checked for; bm25s imports it itself)
+    BM25_BACKEND = "numba"
+except ImportError:
+    BM25_BACKEND = "numpy"
+
+
+def tokenize(text):
+    return text.lower().split()
+
+
+class KeywordIndex:
+    """
+    Holds a snapshot of the corpus, loaded once, next to a prebuilt BM25 index so a query is scored
+    against posting lists instead of re-scanning every document. The Document objects are built here
+    too, so a query only indexes into the snapshot and allocates nothing per corpus entry.
+    Re-running ingest.py replaces the Chroma files on disk, so the app must be restarted either way.
+    """
+
+    def __init__(self, texts, metadatas):
+        self.documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(texts, metadatas)
+        ]
+        self.bm25 = None
+        if texts:
+            # bm25s precomputes every term's per-document scores into a sparse matrix at index time,
+            # so a query only sums a few sparse rows; with numba installed that sum and the top-k
+            # selection run as JIT-compiled loops instead of numpy calls
+            self.bm25 = bm25s.BM25(backend=BM25_BACKEND)
+            self.bm25.index([tokenize(text) for text in texts], show_progress=False)
+            if BM25_BACKEND == "numba":
+                # Compile the scorer now rather than on the first user query
+                self.search(texts[0], k=1)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        all_docs = vectorstore.get()
+        return cls(all_docs.get('documents') or [], all_docs.get('metadatas') or [])
+
+    def search(self, query, k=5):
+        """
+        Returns up to k (Document, score) pairs. Lower scores are better, to match Chroma distances.
+        """
+        tokens = tokenize(query)
+        if self.bm25 is None or not tokens:
+            return []
+        k = min(k, len(self.documents))
+        results, scores = self.bm25.retrieve([tokens], k=k, show_progress=False, backend_selection=BM25_BACKEND)
+        return [
+            (self.documents[i], 1.0 / (1.0 + float(score)))
+            for i, score in zip(results[0], scores[0])
+            if score > 0
+        ]
@@ -0,0 +1,9 @@
+# models.py
+"""
+Return type of load_models() in backend.py and backend_multimodal.py, so both backends hand callers the same shape.
+"""
+from collections import namedtuple
+
+# llm is the chain's chat model, for callers that need it outside the chain (e.g. conversation summaries).
+# vector_index is the int8 QuantizedVectorIndex, or None when the backend or store doesn't provide one.
+Models = namedtuple("Models", ["vectorstore", "chain", "keyword_index", "llm", "vector_index"], defaults=(None, None))
@@ -0,0 +1,42 @@
+# query_embeddings.py
+"""
+Query embedding cache shared by backend.py and backend_multimodal.py, with batched encoding of misses.
+"""
+import threading
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+QUERY_VECTOR_CACHE_SIZE = 256
+
+# LRU of (vectorstore, query) -> embedding, shared across sessions and retrieval threads.
+# Keys hold the vectorstore itself, as functools.lru_cache would, so a freed store's reused id can't match.
+_query_vectors = OrderedDict()
+_query_vectors_lock = threading.Lock()
+
+
+def embed_queries(vectorstore, queries):
+    """
+    Query embeddings, cached so repeated searches for the same string (original, expanded, fallback) embed it once.
+    All uncached queries go to embed_documents() in one call; with BatchedEmbeddings that queues each of them
+    on the shared micro-batching worker, so the model is never called from the caller's thread.
+    """
+    with _query_vectors_lock:
+        found = {}
+        for query in dict.fromkeys(queries):
+            key = (vectorstore, query)
+            found[query] = _query_vectors.get(key)
+            if found[query] is not None:
+                _query_vectors.move_to_end(key)
+    missing = [query for query, vector in found.items() if vector is None]
+    if missing:
+        vectors = vectorstore.embeddings.embed_documents(missing)
+        with _query_vectors_lock:
+            for query, vector in zip(missing, vectors):
+                found[query] = _query_vectors[(vectorstore, query)] = tuple(vector)
+            while len(_query_vectors) > QUERY_VECTOR_CACHE_SIZE:
+                _query_vectors.popitem(last=False)
+    return [found[query] for query in queries]
+
+
+def embed_query(vectorstore, query):
+    return embed_queries(vectorstore, [query])[0]
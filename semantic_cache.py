@@ -0,0 +1,94 @@
+# semantic_cache.py
+"""
+Semantic answer cache: reuses a previous answer when a new query embeds close to one already answered.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+# --- CONFIGURATION ---
+SIMILARITY_THRESHOLD = 0.95
+GROWTH_CHUNK = 1024
+
+
+class SemanticCache:
+    """
+    Keeps L2-normalized query vectors in a preallocated matrix alongside their (answer, sources) entries.
+    A lookup is a single matrix-vector product, so a hit skips both retrieval and the LLM call.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._vectors = None
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query_vector):
+        """
+        Returns the cached (answer, sources) for the closest past query, or None if nothing is similar enough.
+        """
+        q = self._normalize(query_vector)
+        with self._lock:
+            n = len(self._entries)
+            if n == 0:
+                return None
+            scores = self._vectors[:n] @ q
+            i = int(np.argmax(scores))
+            if scores[i] >= self.threshold:
+                return self._entries[i]
+        return None
+
+    def add(self, query_vector, answer, sources):
+        q = self._normalize(query_vector)
+        with self._lock:
+            n = len(self._entries)
+            if self._vectors is None:
+                self._vectors = np.empty((GROWTH_CHUNK, q.shape[0]), dtype=np.float32)
+            elif n == self._vectors.shape[0]:
+                # Grow in whole chunks so appends stay amortized O(1)
+                extra = np.empty((GROWTH_CHUNK, self._vectors.shape[1]), dtype=np.float32)
+                self._vectors = np.vstack([self._vectors, extra])
+            self._vectors[n] = q
+            self._entries.append((answer, sources))
+
+    def save(self, path):
+        """
+        Writes the cache to '<path>.npy' (vectors) and '<path>.json' (answers and sources).
+        """
+        with self._lock:
+            n = len(self._entries)
+            if n == 0:
+                return
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.save(f"{path}.npy", self._vectors[:n])
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+
+    @classmethod
+    def load(cls, path, threshold=SIMILARITY_THRESHOLD):
+        """
+        Restores a cache written by save(); returns an empty cache if nothing was saved yet.
+        """
+        cache = cls(threshold=threshold)
+        if not (os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")):
+            return cache
+        try:
+            vectors = np.load(f"{path}.npy")
+            with open(f"{path}.json", encoding="utf-8") as f:
+                entries = json.load(f)
+            for vector, (answer, sources) in zip(vectors, entries):
+                cache.add(vector, answer, sources)
+        except Exception as e:
+            print(f"Could not load semantic cache from '{path}': {e}")
+        return cache
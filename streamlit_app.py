@@ -1,6 +1,13 @@
-import os
+import io
+import numpy as np
 import streamlit as st
-from backend import load_models, hybrid_search, preprocess_query, process_image_input
+from langchain.memory import ConversationSummaryBufferMemory
+from backend import VECTOR_STORE_PATH, load_models, hybrid_search, preprocess_query, process_image_input, content_fingerprint, embed_query, semantic_search
+from semantic_cache import SemanticCache
+from cache import AnswerStore
+from chunk_sources import ChunkSources
+
+WHISPER_MODEL_SIZE = "small"
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -16,61 +23,100 @@ st.set_page_config(
 # --- INITIALIZE SESSION STATE ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "conversation_context" not in st.session_state:
-    st.session_state.conversation_context = ""
 
 
-vectorstore, chain = load_models()
+@st.cache_resource
+def get_models():
+    """
+    Loads the embedding model, Chroma store, chain, BM25 index and LLM once per process instead of on every rerun.
+    """
+    return load_models()
+
+models = get_models()
+vectorstore, chain, keyword_index, llm = models.vectorstore, models.chain, models.keyword_index, models.llm
+
+
+@st.cache_resource
+def get_chunk_sources():
+    return ChunkSources.load(VECTOR_STORE_PATH)
 
+chunk_sources = get_chunk_sources()
+
+
+def new_conversation_memory():
+    """
+    Keeps recent turns verbatim and folds older ones into a running LLM summary, bounding the prompt size.
+    """
+    return ConversationSummaryBufferMemory(
+        llm=llm,
+        max_token_limit=800,
+        human_prefix="Student",
+        ai_prefix="Assistant"
+    )
 
+if "memory" not in st.session_state:
+    st.session_state.memory = new_conversation_memory()
 
 
+@st.cache_resource
+def get_answer_store():
+    return AnswerStore()
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """
+    Process-wide semantic cache shared across sessions, warm-started from the on-disk answer log.
+    """
+    cache = SemanticCache()
+    get_answer_store().warm(cache)
+    return cache
+
+answer_store = get_answer_store()
+semantic_cache = get_semantic_cache()
+
+
+@st.cache_resource
+def get_whisper_model():
+    from faster_whisper import WhisperModel
+    return WhisperModel(WHISPER_MODEL_SIZE, device="cpu", compute_type="int8")
+
 
 def process_voice_input():
     """
-    Process voice input using speech recognition.
+    Transcribe a recorded question locally with faster-whisper (int8 on CPU).
     Returns the transcribed text or None if failed.
     """
+    audio = st.audio_input("Record your question", key="voice_input", label_visibility="collapsed")
+    # The recording stays in the widget across reruns; only transcribe each recording once
+    if audio is None or audio.file_id == st.session_state.get("last_voice_id"):
+        return None
+    st.session_state.last_voice_id = audio.file_id
+
     try:
-        import speech_recognition as sr
-        r = sr.Recognizer()
-        
-        # Create audio recording interface
-        st.info("🎤 Click the button below and speak your question...")
-        
-        if st.button("🎙️ Start Recording", key="voice_button"):
-            with st.spinner("Listening... Speak now!"):
-                try:
-                    # Use microphone as source
-                    with sr.Microphone() as source:
-                        r.adjust_for_ambient_noise(source, duration=1)
-                        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-                    
-                    with st.spinner("Processing speech..."):
-                        # Use Google's speech recognition
-                        text = r.recognize_google(audio)
-                        
-                        st.success(f"🎯 I heard: '{text}'")
-                        
-                        return text
-                        
-                except sr.WaitTimeoutError:
-                    st.warning("⏰ No speech detected. Please try again.")
-                    return None
-                except sr.UnknownValueError:
-                    st.warning("🤔 Sorry, I couldn't understand what you said. Please try again.")
-                    return None
-                except sr.RequestError as e:
-                    st.error(f"❌ Speech recognition error: {e}")
-                    return None
-                except Exception as e:
-                    st.warning("🎤 Voice input not available. Please ensure you have a microphone connected.")
-                    return None
+        model = get_whisper_model()
     except ImportError:
-        st.warning("🎤 Voice input requires additional packages. Please install: pip install speechrecognition pyaudio")
+        st.warning("🎤 Voice input requires additional packages. Please install: pip install faster-whisper")
+        return None
+    except Exception as e:
+        # e.g. model download or CTranslate2 load failure. cache_resource doesn't cache the
+        # exception, so the next recording retries the load.
+        st.warning(f"🎤 Voice input is unavailable right now: {e}")
         return None
-    
-    return None
+
+    with st.spinner("Processing speech..."):
+        try:
+            segments, _ = model.transcribe(io.BytesIO(audio.getvalue()), vad_filter=True)
+            text = " ".join(segment.text.strip() for segment in segments).strip()
+        except Exception as e:
+            st.error(f"❌ Speech recognition error: {e}")
+            return None
+
+    if not text:
+        st.warning("🤔 Sorry, I couldn't understand what you said. Please try again.")
+        return None
+    st.success(f"🎯 I heard: '{text}'")
+    return text
 
 
 
@@ -189,80 +235,81 @@ if prompt or image_data:
                     # Preprocess the query
                     original_query, expanded_query = preprocess_query(query_text)
                     
-                    # 1. Try hybrid search first
-                    try:
-                        docs_with_scores = hybrid_search(vectorstore, original_query, k=5)
-                    except Exception as e:
-                        # Fallback to regular semantic search if hybrid search fails
-                        docs_with_scores = vectorstore.similarity_search_with_score(original_query, k=5)
+                    # Summary of older turns + recent turns; empty on the first question of a chat
+                    conversation_history = st.session_state.memory.load_memory_variables({})["history"]
                     
-                    # 2. If scores are too high (not similar enough), try with expanded query
-                    if docs_with_scores and docs_with_scores[0][1] > 1.0:
-                        try:
-                            expanded_docs = hybrid_search(vectorstore, expanded_query, k=3)
-                        except:
-                            expanded_docs = vectorstore.similarity_search_with_score(expanded_query, k=3)
-                        
-                        # Combine and deduplicate results
-                        all_docs = docs_with_scores + expanded_docs
-                        seen_content = set()
-                        unique_docs = []
-                        for doc, score in all_docs:
-                            content_hash = hash(doc.page_content[:100])
-                            if content_hash not in seen_content:
-                                seen_content.add(content_hash)
-                                unique_docs.append((doc, score))
-                        docs_with_scores = sorted(unique_docs, key=lambda x: x[1])[:5]
+                    # 0. Reuse a cached answer for near-identical text-only questions. The cache is shared
+                    # across sessions, so only standalone questions (no conversation so far) use it:
+                    # a follow-up's answer depends on its own chat history.
+                    query_vector = None
+                    cached = None
+                    if not image_data and not conversation_history:
+                        query_vector = embed_query(vectorstore, original_query)
+                        cached = semantic_cache.lookup(query_vector)
                     
-                    # 3. Filter documents by similarity threshold
-                    similarity_threshold = 1.2
-                    relevant_docs = [doc for doc, score in docs_with_scores if score < similarity_threshold]
+                    if cached is not None:
+                        result, sources = cached
+                        st.markdown(result)
+                    else:
+                        # 1. Try hybrid search first
+                        try:
+                            docs_with_scores = hybrid_search(vectorstore, original_query, keyword_index, k=5)
+                        except Exception as e:
+                            # Fallback to regular semantic search if hybrid search fails
+                            docs_with_scores = semantic_search(vectorstore, original_query, k=5)
                     
-                    # If no documents meet the threshold, use the top 3 anyway
-                    if not relevant_docs:
-                        relevant_docs = [doc for doc, score in docs_with_scores[:3]]
+                        # 2. If scores are too high (not similar enough), try with expanded query
+                        if docs_with_scores and docs_with_scores[0][1] > 1.0:
+                            try:
+                                expanded_docs = hybrid_search(vectorstore, expanded_query, keyword_index, k=3)
+                            except:
+                                expanded_docs = semantic_search(vectorstore, expanded_query, k=3)
+                        
+                            # Combine and deduplicate results
+                            all_docs = docs_with_scores + expanded_docs
+                            seen_content = set()
+                            unique_docs = []
+                            for doc, score in all_docs:
+                                content_hash = content_fingerprint(doc.page_content)
+                                if content_hash not in seen_content:
+                                    seen_content.add(content_hash)
+                                    unique_docs.append((doc, score))
+                            # Top 5 by score without sorting the whole merged list
+                            scores_np = np.fromiter((score for _, score in unique_docs), dtype=np.float32, count=len(unique_docs))
+                            top = np.argpartition(scores_np, min(5, len(scores_np)) - 1)[:5]
+                            top = top[np.argsort(scores_np[top])]
+                            docs_with_scores = [unique_docs[i] for i in top]
                     
-                    # 4. Prepare context with more information
-                    context_parts = []
-                    for i, doc in enumerate(relevant_docs):
-                        source = doc.metadata.get('source', 'Unknown')
-                        page = doc.metadata.get('page', 'N/A')
-                        context_parts.append(f"Source {i+1} ({source}, Page {page}):\n{doc.page_content}")
+                        # 3. Filter documents by similarity threshold
+                        similarity_threshold = 1.2
+                        relevant_docs = [doc for doc, score in docs_with_scores if score < similarity_threshold]
                     
-                    context = "\n\n".join(context_parts)
+                        # If no documents meet the threshold, use the top 3 anyway
+                        if not relevant_docs:
+                            relevant_docs = [doc for doc, score in docs_with_scores[:3]]
                     
-                    # 5. Prepare conversation history
-                    conversation_history = ""
-                    if len(st.session_state.messages) > 1:  # More than just the current message
-                        recent_messages = st.session_state.messages[-6:]  # Last 3 exchanges (6 messages)
-                        history_parts = []
-                        for msg in recent_messages[:-1]:  # Exclude current message
-                            role = "Student" if msg["role"] == "user" else "Assistant"
-                            content = msg['content']
-                            if msg.get('has_image'):
-                                content += " [Student also shared an image]"
-                            history_parts.append(f"{role}: {content}")
-                        conversation_history = "\n".join(history_parts)
+                        # 4. Prepare context with more information
+                        context_parts = []
+                        for i, doc in enumerate(relevant_docs):
+                            source = doc.metadata.get('source', 'Unknown')
+                            page = doc.metadata.get('page', 'N/A')
+                            context_parts.append(f"Source {i+1} ({source}, Page {page}):\n{doc.page_content}")
                     
-                    # 6. Generate response
-                    result = chain.run(
-                        conversation_history=conversation_history,
-                        context=context, 
-                        question=original_query
-                    )
+                        context = "\n\n".join(context_parts)
                     
-                    # Display the response
-                    st.markdown(result)
+                        # 5. Generate response, rendering tokens as they arrive
+                        result = st.write_stream(chain.stream({
+                            "conversation_history": conversation_history,
+                            "context": context,
+                            "question": original_query
+                        }))
                     
-                    # Prepare sources information
-                    sources = []
-                    for doc in relevant_docs:
-                        source_file = os.path.basename(doc.metadata.get('source', 'Unknown'))
-                        source_info = {
-                            "source": source_file,
-                            "page": doc.metadata.get('page', 'N/A')
-                        }
-                        sources.append(source_info)
+                        # Prepare sources information
+                        sources = chunk_sources.for_docs(relevant_docs)
+                        
+                        if query_vector is not None:
+                            semantic_cache.add(query_vector, result, sources)
+                            answer_store.add(original_query, result, sources, query_vector)
                     
                     # Add assistant message to chat history
                     assistant_message = {
@@ -272,13 +319,9 @@ if prompt or image_data:
                     }
                     st.session_state.messages.append(assistant_message)
                     
-                    # Update conversation context
-                    new_context = f"Student: {query_text}\nAssistant: {result}"
-                    if len(st.session_state.conversation_context) > 2000:  # Keep context manageable
-                        # Keep only the last portion of the conversation
-                        st.session_state.conversation_context = st.session_state.conversation_context[-1000:] + "\n" + new_context
-                    else:
-                        st.session_state.conversation_context += "\n" + new_context
+                    # Update conversation memory
+                    student_turn = query_text + (" [Student also shared an image]" if image_data else "")
+                    st.session_state.memory.save_context({"input": student_turn}, {"output": result})
 
                 except Exception as e:
                     st.error(f"An error occurred: {e}")
@@ -291,7 +334,7 @@ with st.sidebar:
     # Clear chat button
     if st.button("🗑️ Clear Chat", use_container_width=True):
         st.session_state.messages = []
-        st.session_state.conversation_context = ""
+        st.session_state.memory = new_conversation_memory()
         st.rerun()
     
     # Chat statistics
@@ -327,6 +370,7 @@ with st.sidebar:
     if st.checkbox("Show debug info"):
         st.write("**Session State:**")
         st.write(f"Messages: {len(st.session_state.messages)}")
-        st.write(f"Conversation context length: {len(st.session_state.conversation_context)}")
+        st.write(f"Conversation summary length: {len(st.session_state.memory.moving_summary_buffer)}")
+        st.write(f"Turns kept verbatim: {len(st.session_state.memory.chat_memory.messages) // 2}")
     
     st.warning("**Note:** The AI's knowledge is limited to the indexed NCERT textbooks.")
\ No newline at end of file
@@ -1,88 +1,82 @@
 import os
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import json
-from backend_multimodal import load_models, hybrid_search, preprocess_query, process_image_input
 
-# --- PAGE CONFIGURATION ---
-st.set_page_config(
-    page_title="Q2C",
-    page_icon="📃",
-    layout="wide",
-)
-
-
-
-
-
-# --- INITIALIZE SESSION STATE ---
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "conversation_context" not in st.session_state:
-    st.session_state.conversation_context = ""
-if "user_language" not in st.session_state:
-    st.session_state.user_language = "en"
-
-
-vectorstore, chain = load_models()
-
-
-
-
-
-def process_voice_input():
-    """
-    Process voice input using speech recognition.
-    Returns the transcribed text or None if failed.
-    """
-    try:
-        import speech_recognition as sr
-        r = sr.Recognizer()
-        
-        # Create audio recording interface
-        st.info("🎤 Click the button below and speak your question...")
-        
-        if st.button("🎙️ Start Recording", key="voice_button"):
-            with st.spinner("Listening... Speak now!"):
-                try:
-                    # Use microphone as source
-                    with sr.Microphone() as source:
-                        r.adjust_for_ambient_noise(source, duration=1)
-                        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-                    
-                    with st.spinner("Processing speech..."):
-                        # Use Google's speech recognition
-                        text = r.recognize_google(audio)
-                        
-                        st.success(f"🎯 I heard: '{text}'")
-                        
-                        return text
-                        
-                except sr.WaitTimeoutError:
-                    st.warning("⏰ No speech detected. Please try again.")
-                    return None
-                except sr.UnknownValueError:
-                    st.warning("🤔 Sorry, I couldn't understand what you said. Please try again.")
-                    return None
-                except sr.RequestError as e:
-                    st.error(f"❌ Speech recognition error: {e}")
-                    return None
-                except Exception as e:
-                    st.warning("🎤 Voice input not available. Please ensure you have a microphone connected.")
-                    return None
-    except ImportError:
-        st.warning("🎤 Voice input requires additional packages. Please install: pip install speechrecognition pyaudio")
-        return None
+# Optional voice backend, checked once here instead of on every call to process_voice_input()
+try:
+    import speech_recognition as sr
+    SPEECH_RECOGNITION_AVAILABLE = True
+except ImportError:
+    SPEECH_RECOGNITION_AVAILABLE = False
+
+# --- CONFIGURATION ---
+MAX_CHUNK_CHARS = 1500    # Per retrieved chunk sent to the LLM
+MAX_CONTEXT_CHARS = 6000  # Across all chunks in one turn
+
+# --- SIDEBAR CONTENT ---
+# Language selector options
+LANGUAGES = {
+    "en": "🇺🇸 English",
+    "hi": "🇮🇳 हिंदी (Hindi)",
+    "bn": "🇧🇩 বাংলা (Bengali)", 
+    "te": "🇮🇳 తెలుగు (Telugu)",
+    "mr": "🇮🇳 मराठी (Marathi)",
+    "ta": "🇮🇳 தமிழ் (Tamil)",
+    "ur": "🇵🇰 اردو (Urdu)",
+    "gu": "🇮🇳 ગુજરાતી (Gujarati)",
+    "kn": "🇮🇳 ಕನ್ನಡ (Kannada)",
+    "ml": "🇮🇳 മലയാളം (Malayalam)",
+    "es": "🇪🇸 Español",
+    "fr": "🇫🇷 Français",
+    "de": "🇩🇪 Deutsch",
+    "zh": "🇨🇳 中文",
+    "ar": "🇸🇦 العربية"
+}
+
+# Sidebar help text, filled in with the current language on each render
+_SIDEBAR_INPUT_MD = """
+    **💬 Text**: Type in any supported language
+    - Current: {language}
     
-    return None
-
-
-
-def create_multimodal_prompt(text_query, image_data=None, conversation_history=""):
+    **🎤 Voice**: Speak in your preferred language
+    - Auto-detects language when enabled
+    - Supports 15+ languages including all major Indian languages
+    
+    **🖼️ Images**: Upload diagrams, equations, or textbook pages
+    - Supports PNG, JPG, JPEG formats
+    - Perfect for homework problems or diagrams
+    
+    **🌍 Multilingual**: 
+    - Auto-detects your language or manually select
+    - Responses in your preferred language
+    - Seamless translation between languages
     """
-    Create a prompt that can handle both text and image inputs for policy and legal document analysis.
+
+_SIDEBAR_TIPS_MD = """
+    **For better multilingual conversations:**
+    - Ask in any language: हिंदी, English, বাংলা, தமிழ், etc.
+    - Mix languages freely - the AI adapts automatically
+    - Use voice in your native language for natural interaction
+    - Combine voice + image: Speak while uploading a diagram
+    
+    **Sample conversation starters:**
+    - 🗣️ English: "Hi! What topics can you help me with?"
+    - �️ Hindi: "मुझे भौतिकी में मदद चाहिए" 
+    - 🗣️ Bengali: "পদার্থবিজ্ঞান সম্পর্কে বলুন"
+    - 🖼️ Upload diagram + ask: "এটি ব্যাখ্যা করুন" (Explain this)
+    - 🎤 Voice: "Energy conservation के बारे में बताओ"
+    
+    **Current Language**: {language}
     """
-    if image_data:
-        return f"""
+
+# --- PROMPT TEMPLATES ---
+# Filled in by create_multimodal_prompt(); {{context}} is left as {context} for the chain
+_PROMPT_WITH_IMAGE = """
 You are an expert legal and policy analysis assistant specializing in insurance policies, contracts, and compliance documents. The user has provided both text and an image.
 
 Previous conversation:
@@ -104,8 +98,8 @@ Context from policy document(s):
 
 Your Response (provide structured analysis with decision, reasoning, and clause references):
 """
-    else:
-        return f"""
+
+_PROMPT_TEXT_ONLY = """
 You are an expert legal and policy analysis assistant specializing in insurance policies, contracts, HR policies, and compliance documents. You help users interpret complex policy language and make informed decisions based on natural language queries.
 
 Previous conversation:
@@ -128,256 +122,406 @@ Please:
 Your Response:
 """
 
+# --- PAGE CONFIGURATION ---
+st.set_page_config(
+    page_title="Q2C",
+    page_icon="📃",
+    layout="wide",
+)
+
+
+
+
+
+# --- INITIALIZE SESSION STATE ---
+if "messages" not in st.session_state:
+    st.session_state.messages = deque()
+if "user_msg_count" not in st.session_state:
+    st.session_state.user_msg_count = 0
+if "conversation_context" not in st.session_state:
+    st.session_state.conversation_context = ""
+if "user_language" not in st.session_state:
+    st.session_state.user_language = "en"
+if "submit_seq" not in st.session_state:
+    st.session_state.submit_seq = 0
+    st.session_state.last_processed_seq = 0
+    st.session_state.last_submitted_image_id = None
+
+
+@st.cache_resource(show_spinner="Loading models…")
+def get_models():
+    """
+    Loads the embedding model, Chroma store, chain, BM25 index and int8 vector index once per process instead of on every rerun.
+    backend_multimodal (LangChain, Chroma, PIL, ...) is imported here rather than at the top, so the
+    loading spinner is up while those imports run; callers use its functions through the returned module.
+    """
+    import backend_multimodal
+    return backend_multimodal, backend_multimodal.load_models()
+
+backend, models = get_models()
+vectorstore, chain, keyword_index, vector_index = models.vectorstore, models.chain, models.keyword_index, models.vector_index
+
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def cached_hybrid_search(query, k):
+    """
+    Hybrid search results keyed on (query, k), so repeating a question skips BM25 scoring and the ANN probe.
+    """
+    return backend.hybrid_search(vectorstore, query, keyword_index, k=k, vector_index=vector_index)
+
+
+def retrieve(query, k):
+    """
+    Hybrid search, falling back to regular semantic search if it fails.
+    """
+    try:
+        return cached_hybrid_search(query, k=k)
+    except Exception:
+        return backend.semantic_search(vectorstore, query, k=k, vector_index=vector_index)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def encode_image(raw):
+    """
+    process_image_bytes() keyed on the upload's bytes, minus the PIL image: only the base64 payload and
+    MIME type are pickled into the cache, so a hit never re-decodes pixels. Previews use the raw bytes.
+    """
+    image_data = backend.process_image_bytes(raw)
+    if image_data is not None:
+        del image_data["image"]
+    return image_data
+
+
+@st.cache_resource
+def get_retrieval_executor():
+    # One pool for all sessions; speculative searches can keep running after the turn that started them
+    return ThreadPoolExecutor(max_workers=8)
+
+
+def submit_retrieval(query, k):
+    """
+    Runs retrieve() on the shared pool. Pool threads have no ScriptRunContext, which st.cache_data
+    in retrieve() expects, so the calling run's context is attached to the worker for the task.
+    """
+    ctx = get_script_run_ctx()
+
+    def run():
+        add_script_run_ctx(ctx=ctx)
+        return retrieve(query, k)
+
+    return get_retrieval_executor().submit(run)
+
+
+
+
+
+@st.cache_resource
+def get_recognizer():
+    """
+    One Recognizer per process, so its ambient-noise energy threshold carries over between recordings.
+    The Microphone stays per call because it owns a PortAudio stream.
+    """
+    return sr.Recognizer()
+
+
+def process_voice_input():
+    """
+    Process voice input using speech recognition.
+    Returns the transcribed text or None if failed.
+    """
+    if not SPEECH_RECOGNITION_AVAILABLE:
+        st.warning("🎤 Voice input requires additional packages. Please install: pip install speechrecognition pyaudio")
+        return None
+
+    r = get_recognizer()
+    
+    # Create audio recording interface
+    st.info("🎤 Click the button below and speak your question...")
+    
+    if st.button("🎙️ Start Recording", key="voice_button"):
+        with st.spinner("Listening... Speak now!"):
+            try:
+                # Use microphone as source
+                with sr.Microphone() as source:
+                    r.adjust_for_ambient_noise(source, duration=1)
+                    audio = r.listen(source, timeout=5, phrase_time_limit=10)
+                
+                with st.spinner("Processing speech..."):
+                    # Use Google's speech recognition
+                    text = r.recognize_google(audio)
+                    
+                    st.success(f"🎯 I heard: '{text}'")
+                    
+                    return text
+                    
+            except sr.WaitTimeoutError:
+                st.warning("⏰ No speech detected. Please try again.")
+                return None
+            except sr.UnknownValueError:
+                st.warning("🤔 Sorry, I couldn't understand what you said. Please try again.")
+                return None
+            except sr.RequestError as e:
+                st.error(f"❌ Speech recognition error: {e}")
+                return None
+            except Exception as e:
+                st.warning("🎤 Voice input not available. Please ensure you have a microphone connected.")
+                return None
+    
+    return None
+
+
+def create_multimodal_prompt(text_query, image_data=None, conversation_history=""):
+    """
+    Create a prompt that can handle both text and image inputs for policy and legal document analysis.
+    """
+    template = _PROMPT_WITH_IMAGE if image_data else _PROMPT_TEXT_ONLY
+    return template.format(conversation_history=conversation_history, text_query=text_query)
+
 
 
 # --- STREAMLIT APP ---
 st.title("Query to Clause 📃")
 st.markdown("Chat with your legal documents! Ask questions and have a conversation about your queries.")
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-        if message["role"] == "assistant" and "sources" in message:
-            with st.expander("📖 Sources"):
-                for source in message["sources"]:
-                    st.write(f"- **{source['source']}** (Page: {source['page']})")
-        # Display images in user messages
-        if message["role"] == "user" and "image" in message:
-            st.image(message["image"], caption="Uploaded Image", width=300)
-
-# --- MULTIMODAL INPUT SECTION ---
-st.markdown("### 💬 Ask your question using:")
-
-# Create columns for different input types
-col1, col2, col3 = st.columns([2, 1, 1])
-
-with col1:
-    # Text input (primary)
-    text_input = st.chat_input("Type your question here...")
-
-with col2:
-    # Voice input
-    st.markdown("**🎤 Voice**")
-    voice_text = process_voice_input()
-
-with col3:
-    # Image input
-    st.markdown("**🖼️ Image**")
-    uploaded_image = st.file_uploader(
-        "Upload an image",
-        type=['png', 'jpg', 'jpeg'],
-        key="image_uploader",
-        label_visibility="collapsed"
-    )
-
-# Process the input (text, voice, or both)
-prompt = text_input or voice_text
-image_data = process_image_input(uploaded_image) if uploaded_image else None
-
-if prompt or image_data:
-    if vectorstore is None or chain is None:
-        st.error("Backend models are not loaded. Please check the error message above.")
-    else:
-        # Prepare the user message
-        user_message = {"role": "user", "content": prompt or "Please analyze this image"}
-        if image_data:
-            user_message["image"] = image_data["image"]
-            user_message["has_image"] = True
+@st.fragment
+def chat_panel():
+    """
+    Chat history, input widgets and response generation. As a fragment, widget interactions here
+    rerun only this panel; a completed turn triggers one full rerun so the sidebar metrics catch up.
+    """
+    # Display chat messages
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message["role"] == "assistant" and "sources" in message:
+                with st.expander("📖 Sources"):
+                    for source in message["sources"]:
+                        st.write(f"- **{source['source']}** (Page: {source['page']})")
+            if message.get("show_tip"):
+                st.info("💡 **Tip**: Try rephrasing your question or use more specific terms!")
+            # Display images in user messages
+            if message["role"] == "user" and "image" in message:
+                st.image(message["image"], caption="Uploaded Image", width=300)
+
+    # --- MULTIMODAL INPUT SECTION ---
+    st.markdown("### 💬 Ask your question using:")
+
+    # Create columns for different input types
+    col1, col2, col3 = st.columns([2, 1, 1])
+
+    with col1:
+        # Text input (primary)
+        text_input = st.chat_input("Type your question here...")
+
+    with col2:
+        # Voice input
+        st.markdown("**🎤 Voice**")
+        voice_text = process_voice_input()
+
+    with col3:
+        # Image input
+        st.markdown("**🖼️ Image**")
+        uploaded_image = st.file_uploader(
+            "Upload an image",
+            type=['png', 'jpg', 'jpeg'],
+            key="image_uploader",
+            label_visibility="collapsed"
+        )
+
+    # Process the input (text, voice, or both)
+    prompt = text_input or voice_text
+    image_data = None
+    if uploaded_image:
+        raw = uploaded_image.getvalue()
+        encoded = encode_image(raw)
+        if encoded is not None:
+            image_data = {**encoded, "image": raw}
+
+    # Number each new submission. A typed or spoken prompt is only returned on the run it was
+    # submitted, but an uploaded image stays in the uploader, so it counts once per file.
+    image_id = uploaded_image.file_id if image_data else None
+    if prompt or (image_id is not None and image_id != st.session_state.last_submitted_image_id):
+        st.session_state.submit_seq += 1
+        st.session_state.last_submitted_image_id = image_id
+
+    # Reruns without a new submission (sidebar widgets, fragment reruns) skip retrieval and the LLM
+    if st.session_state.submit_seq > st.session_state.last_processed_seq:
+        st.session_state.last_processed_seq = st.session_state.submit_seq
+        if vectorstore is None or chain is None:
+            st.error("Backend models are not loaded. Please check the error message above.")
+        else:
+            # Prepare the user message
+            user_message = {"role": "user", "content": prompt or "Please analyze this image"}
+            if image_data:
+                user_message["image"] = image_data["image"]
+                user_message["has_image"] = True
         
-        # Add user message to chat history
-        st.session_state.messages.append(user_message)
+            # Add user message to chat history
+            st.session_state.messages.append(user_message)
+            st.session_state.user_msg_count += 1
         
-        # Display user message
-        with st.chat_message("user"):
-            if prompt:
-                st.markdown(prompt)
-            if image_data:
-                st.image(image_data["image"], caption="Uploaded Image", width=300)
+            # Display user message
+            with st.chat_message("user"):
+                if prompt:
+                    st.markdown(prompt)
+                if image_data:
+                    st.image(image_data["image"], caption="Uploaded Image", width=300)
         
-        # Generate assistant response
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Use the prompt or default for image-only queries
-                    query_text = prompt or "Please analyze this image and explain what you see"
-                    
-                    # Preprocess the query
-                    original_query, expanded_query = preprocess_query(query_text)
-                    
-                    # 1. Try hybrid search first
+            # Generate assistant response
+            with st.chat_message("assistant"):
+                with st.spinner("Thinking..."):
                     try:
-                        docs_with_scores = hybrid_search(vectorstore, original_query, k=5)
-                    except Exception as e:
-                        # Fallback to regular semantic search if hybrid search fails
-                        docs_with_scores = vectorstore.similarity_search_with_score(original_query, k=5)
+                        # Use the prompt or default for image-only queries
+                        query_text = prompt or "Please analyze this image and explain what you see"
                     
-                    # 2. If scores are too high (not similar enough), try with expanded query
-                    if docs_with_scores and docs_with_scores[0][1] > 1.0:
-                        try:
-                            expanded_docs = hybrid_search(vectorstore, expanded_query, k=3)
-                        except:
-                            expanded_docs = vectorstore.similarity_search_with_score(expanded_query, k=3)
-                        
-                        # Combine and deduplicate results
-                        all_docs = docs_with_scores + expanded_docs
-                        seen_content = set()
-                        unique_docs = []
-                        for doc, score in all_docs:
-                            content_hash = hash(doc.page_content[:100])
-                            if content_hash not in seen_content:
-                                seen_content.add(content_hash)
-                                unique_docs.append((doc, score))
-                        docs_with_scores = sorted(unique_docs, key=lambda x: x[1])[:5]
+                        # Preprocess the query
+                        original_query, expanded_query = backend.preprocess_query(query_text)
                     
-                    # 3. Filter documents by similarity threshold
-                    similarity_threshold = 1.2
-                    relevant_docs = [doc for doc, score in docs_with_scores if score < similarity_threshold]
+                        # 1. Search with the original query, and speculatively with the expanded one in parallel
+                        expanded_future = None
+                        needs_expansion = expanded_query != original_query.lower().strip()
+                        if needs_expansion:
+                            # One embedding forward pass for both queries; the searches reuse the cached vectors
+                            backend.embed_queries(vectorstore, [original_query, expanded_query])
+                        original_future = submit_retrieval(original_query, 5)
+                        if needs_expansion:
+                            expanded_future = submit_retrieval(expanded_query, 3)
+                        docs_with_scores = original_future.result()
                     
-                    # If no documents meet the threshold, use the top 3 anyway
-                    if not relevant_docs:
-                        relevant_docs = [doc for doc, score in docs_with_scores[:3]]
+                        # 2. If scores are too high (not similar enough), use the expanded query results
+                        if docs_with_scores and docs_with_scores[0][1] > 1.0:
+                            # Without synonyms the expanded query would only repeat the original results
+                            expanded_docs = expanded_future.result() if expanded_future else []
+                        
+                            # Combine and deduplicate results
+                            all_docs = docs_with_scores + expanded_docs
+                            seen_content = set()
+                            unique_docs = []
+                            for doc, score in all_docs:
+                                content_hash = backend.content_fingerprint(doc.page_content)
+                                if content_hash not in seen_content:
+                                    seen_content.add(content_hash)
+                                    unique_docs.append((doc, score))
+                            # Top 5 by score without sorting the whole merged list
+                            scores = np.fromiter((score for _, score in unique_docs), dtype=np.float32, count=len(unique_docs))
+                            keep = np.argpartition(scores, min(5, len(scores)) - 1)[:5]
+                            keep = keep[np.argsort(scores[keep])]
+                            docs_with_scores = [unique_docs[i] for i in keep]
+                        elif expanded_future:
+                            # Not needed; drop it if it hasn't started (a running search just fills the cache)
+                            expanded_future.cancel()
                     
-                    # 4. Prepare context with more information
-                    context_parts = []
-                    for i, doc in enumerate(relevant_docs):
-                        source = doc.metadata.get('source', 'Unknown')
-                        page = doc.metadata.get('page', 'N/A')
-                        context_parts.append(f"Source {i+1} ({source}, Page {page}):\n{doc.page_content}")
+                        # 3. Filter documents by similarity threshold
+                        similarity_threshold = 1.2
+                        scores = np.fromiter((score for _, score in docs_with_scores), dtype=np.float32, count=len(docs_with_scores))
+                        relevant_docs = [docs_with_scores[i][0] for i in np.flatnonzero(scores < similarity_threshold)]
                     
-                    context = "\n\n".join(context_parts)
+                        # If no documents meet the threshold, use the top 3 anyway
+                        if not relevant_docs:
+                            relevant_docs = [doc for doc, score in docs_with_scores[:3]]
                     
-                    # 5. Prepare conversation history
-                    conversation_history = ""
-                    if len(st.session_state.messages) > 1:  # More than just the current message
-                        recent_messages = st.session_state.messages[-6:]  # Last 3 exchanges (6 messages)
-                        history_parts = []
-                        for msg in recent_messages[:-1]:  # Exclude current message
-                            role = "Student" if msg["role"] == "user" else "Assistant"
-                            content = msg['content']
-                            if msg.get('has_image'):
-                                content += " [Student also shared an image]"
-                            history_parts.append(f"{role}: {content}")
-                        conversation_history = "\n".join(history_parts)
+                        # 4. Prepare context, truncating chunks so the LLM input stays bounded
+                        context_parts = []
+                        budget = MAX_CONTEXT_CHARS
+                        for i, doc in enumerate(relevant_docs):
+                            snippet = doc.page_content[:MAX_CHUNK_CHARS]
+                            if len(snippet) > budget:
+                                break
+                            budget -= len(snippet)
+                            source = doc.metadata.get('source', 'Unknown')
+                            page = doc.metadata.get('page', 'N/A')
+                            context_parts.append(f"Source {i+1} ({source}, Page {page}):\n{snippet}")
+                        # Only cite the chunks that made it into the context
+                        relevant_docs = relevant_docs[:len(context_parts)]
                     
-                    # 6. Generate response
-                    result = chain.run(
-                        conversation_history=conversation_history,
-                        context=context, 
-                        question=original_query
-                    )
+                        context = "\n\n".join(context_parts)
                     
-                    # Display the response
-                    st.markdown(result)
+                        # 5. Prepare conversation history
+                        conversation_history = ""
+                        if len(st.session_state.messages) > 1:  # More than just the current message
+                            # Last 3 exchanges (6 messages), walked from the end so long chats aren't copied
+                            recent_messages = list(islice(reversed(st.session_state.messages), 6))[::-1]
+                            history_parts = []
+                            for msg in recent_messages[:-1]:  # Exclude current message
+                                role = "Student" if msg["role"] == "user" else "Assistant"
+                                content = msg['content']
+                                if msg.get('has_image'):
+                                    content += " [Student also shared an image]"
+                                history_parts.append(f"{role}: {content}")
+                            conversation_history = "\n".join(history_parts)
                     
-                    # Prepare sources information
-                    sources = []
-                    for doc in relevant_docs:
-                        source_file = os.path.basename(doc.metadata.get('source', 'Unknown'))
-                        source_info = {
-                            "source": source_file,
-                            "page": doc.metadata.get('page', 'N/A')
-                        }
-                        if source_info not in sources:
-                            sources.append(source_info)
+                        # 6. Generate response
+                        # Render tokens as they arrive; write_stream returns the full text
+                        result = st.write_stream(chain.stream({
+                            "conversation_history": conversation_history,
+                            "context": context,
+                            "question": original_query
+                        }))
                     
-                    # Display sources
-                    with st.expander("📖 Sources"):
-                        for source in sources:
-                            st.write(f"- **{source['source']}** (Page: {source['page']})")
+                        # Prepare sources information
+                        sources = []
+                        seen_sources = set()
+                        for doc in relevant_docs:
+                            source_file = os.path.basename(doc.metadata.get('source', 'Unknown'))
+                            page = doc.metadata.get('page', 'N/A')
+                            if (source_file, page) not in seen_sources:
+                                seen_sources.add((source_file, page))
+                                sources.append({"source": source_file, "page": page})
                     
-                    # Add assistant response to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": result,
-                        "sources": sources
-                    })
+                        # Display sources
+                        with st.expander("📖 Sources"):
+                            for source in sources:
+                                st.write(f"- **{source['source']}** (Page: {source['page']})")
                     
-                    # Check if the answer indicates no relevant information was found
-                    if "cannot find" in result.lower() or "no relevant information" in result.lower():
-                        st.info("💡 **Tip**: Try rephrasing your question or use more specific terms!")
+                        # Add assistant response to chat history, flagging answers that found nothing
+                        # relevant so the history shows a rephrasing tip under them
+                        st.session_state.messages.append({
+                            "role": "assistant", 
+                            "content": result,
+                            "sources": sources,
+                            "show_tip": "cannot find" in result.lower() or "no relevant information" in result.lower()
+                        })
+
+                    except Exception as e:
+                        error_msg = f"I'm sorry, I encountered an error while processing your question: {str(e)}"
+                        st.error(error_msg)
+                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
+
+            # Rerun the whole app once so the sidebar metrics include this turn. The history
+            # above re-renders it, and the submission guard keeps it from being processed again.
+            st.rerun(scope="app")
 
-                except Exception as e:
-                    error_msg = f"I'm sorry, I encountered an error while processing your question: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+chat_panel()
 
 # --- SIDEBAR ---
-with st.sidebar:
+@st.fragment
+def render_sidebar():
+    """
+    Sidebar as a fragment, so its own widgets (e.g. the debug checkbox) rerun only the sidebar.
+    """
+    current_language = LANGUAGES.get(st.session_state.user_language, '🇺🇸 English')
     st.header("💬 Chat Controls")
     
     # Clear chat button
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.messages = []
+        st.session_state.messages = deque()
+        st.session_state.user_msg_count = 0
         st.session_state.conversation_context = ""
         st.rerun()
     
-
-    
-    # Language selector
-    languages = {
-        "en": "🇺🇸 English",
-        "hi": "🇮🇳 हिंदी (Hindi)",
-        "bn": "🇧🇩 বাংলা (Bengali)", 
-        "te": "🇮🇳 తెలుగు (Telugu)",
-        "mr": "🇮🇳 मराठी (Marathi)",
-        "ta": "🇮🇳 தமிழ் (Tamil)",
-        "ur": "🇵🇰 اردو (Urdu)",
-        "gu": "🇮🇳 ગુજરાતી (Gujarati)",
-        "kn": "🇮🇳 ಕನ್ನಡ (Kannada)",
-        "ml": "🇮🇳 മലയാളം (Malayalam)",
-        "es": "🇪🇸 Español",
-        "fr": "🇫🇷 Français",
-        "de": "🇩🇪 Deutsch",
-        "zh": "🇨🇳 中文",
-        "ar": "🇸🇦 العربية"
-    }
-
-    
     # Chat statistics
     if st.session_state.messages:
         st.metric("Messages in chat", len(st.session_state.messages))
-        st.metric("Your questions", len([m for m in st.session_state.messages if m["role"] == "user"]))
+        st.metric("Your questions", st.session_state.user_msg_count)
     
     st.header("About EduRAG")
     st.info("This is a multilingual, multimodal conversational AI assistant for your Legal Documents and Contracts . Chat in your native language using text, voice, and images!")
     
     st.header("🎯 Input Methods")
-    st.markdown(f"""
-    **💬 Text**: Type in any supported language
-    - Current: {languages.get(st.session_state.user_language, '🇺🇸 English')}
-    
-    **🎤 Voice**: Speak in your preferred language
-    - Auto-detects language when enabled
-    - Supports 15+ languages including all major Indian languages
-    
-    **🖼️ Images**: Upload diagrams, equations, or textbook pages
-    - Supports PNG, JPG, JPEG formats
-    - Perfect for homework problems or diagrams
-    
-    **🌍 Multilingual**: 
-    - Auto-detects your language or manually select
-    - Responses in your preferred language
-    - Seamless translation between languages
-    """)
+    st.markdown(_SIDEBAR_INPUT_MD.format(language=current_language))
     
     st.header("💡 Chat Tips")
-    st.markdown(f"""
-    **For better multilingual conversations:**
-    - Ask in any language: हिंदी, English, বাংলা, தமிழ், etc.
-    - Mix languages freely - the AI adapts automatically
-    - Use voice in your native language for natural interaction
-    - Combine voice + image: Speak while uploading a diagram
-    
-    **Sample conversation starters:**
-    - 🗣️ English: "Hi! What topics can you help me with?"
-    - �️ Hindi: "मुझे भौतिकी में मदद चाहिए" 
-    - 🗣️ Bengali: "পদার্থবিজ্ঞান সম্পর্কে বলুন"
-    - 🖼️ Upload diagram + ask: "এটি ব্যাখ্যা করুন" (Explain this)
-    - 🎤 Voice: "Energy conservation के बारे में बताओ"
-    
-    **Current Language**: {languages.get(st.session_state.user_language, '🇺🇸 English')}
-    """)
+    st.markdown(_SIDEBAR_TIPS_MD.format(language=current_language))
     
     st.header("🔧 Advanced")
     if st.checkbox("Show debug info"):
@@ -386,3 +530,6 @@ with st.sidebar:
         st.write(f"Conversation context length: {len(st.session_state.conversation_context)}")
     
     st.warning("**Note:** The AI's knowledge is limited to the indexed NCERT textbooks.")
+
+with st.sidebar:
+    render_sidebar()
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+from batched_embeddings import BatchedEmbeddings
+
+
+class ConcurrencyCheckingEncoder:
+    """
+    Stand-in model that records how many threads are inside encode() at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self.max_active = 0
+
+    def __call__(self, texts):
+        with self._lock:
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        time.sleep(0.005)
+        with self._lock:
+            self._active -= 1
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_queries_and_documents_never_encode_concurrently():
+    encoder = ConcurrencyCheckingEncoder()
+    embeddings = BatchedEmbeddings(encoder, max_batch_size=4, timeout_ms=2)
+    results = {}
+
+    def embed_documents(i):
+        results[("docs", i)] = embeddings.embed_documents(["a" * i, "b" * (i + 1), "c" * (i + 2)])
+
+    def embed_query(i):
+        results[("query", i)] = embeddings.embed_query("q" * i)
+
+    threads = [threading.Thread(target=embed_documents, args=(i,)) for i in range(1, 6)]
+    threads += [threading.Thread(target=embed_query, args=(i,)) for i in range(1, 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    embeddings.close(timeout=1)
+
+    assert encoder.max_active == 1
+    for i in range(1, 6):
+        assert results[("docs", i)] == [[float(i), 1.0], [float(i + 1), 1.0], [float(i + 2), 1.0]]
+        assert results[("query", i)] == [float(i), 1.0]
+
+
+def test_close_stops_the_worker():
+    embeddings = BatchedEmbeddings(ConcurrencyCheckingEncoder(), timeout_ms=1)
+    assert embeddings.embed_query("abc") == [3.0, 1.0]
+    embeddings.close(timeout=1)
+    assert not embeddings._worker.is_alive()
+    try:
+        embeddings.embed_documents(["x"])
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("embed_documents should fail after close()")